@@ -1,6 +1,7 @@
 from flask import Flask, jsonify, send_from_directory, abort
 from flask_cors import CORS
 import pandas as pd
+import json
 import os
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
@@ -38,10 +39,11 @@ def positions():
     path = os.path.join(BASE, 'open_positions.json')
     if not os.path.exists(path):
         return jsonify([])
-    import json
-    with open(path, 'r') as f:
-        data = json.load(f)
-    return jsonify(data)
+    # Lectura en bytes y un único parseo: un archivo truncado o editado a mano falla aquí
+    # (error del servidor con traza) en lugar de llegar al frontend como JSON inválido
+    with open(path, 'rb') as f:
+        payload = f.read()
+    return jsonify(json.loads(payload))
 
 @app.route('/api/backtest')
 def backtest():
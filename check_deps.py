@@ -4,8 +4,8 @@ import sys
 
 def check_dependencies():
     dependencies = [
-        'pandas', 'ccxt', 'telebot', 'ta', 'numpy', 
-        'pytz', 'dateutil', 'jsonschema', 'dotenv'
+        'pandas', 'ccxt', 'telebot', 'numpy', 
+        'dateutil', 'jsonschema', 'orjson', 'dotenv'
     ]
     
     missing = []
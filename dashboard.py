@@ -111,9 +111,8 @@ kraken_available = True
 try:
     from kraken_data import (
         initialize_kraken_exchange,
-        fetch_recent_data,
+        fetch_recent_ohlcv,
         preprocess_data_for_time_bias,
-        mark_kill_zones,
         analyze_gross_return,
         calculate_atr,
         execute_trade_simulation,
@@ -185,14 +184,15 @@ with col1:
                     st.success("Conexión a Kraken establecida.")
 
                     # Obtener datos recientes
-                    df_hist = fetch_recent_data(kraken, symbol=selected_symbol.replace('_', '/'), timeframe=timeframe, limit=hours_to_analyze)
-                    if df_hist is None:
+                    velas = fetch_recent_ohlcv(kraken, symbol=selected_symbol.replace('_', '/'), timeframe=timeframe, limit=hours_to_analyze)
+                    if velas is None:
                         st.warning("No se obtuvieron datos OHLCV.")
                     else:
-                        df_proc = preprocess_data_for_time_bias(df_hist.copy())
-                        df_zones = mark_kill_zones(df_proc.copy())
+                        df_hist = velas.to_frame()
+                        # preprocess ya marca la Kill Zone en la misma pasada
+                        df_zones = preprocess_data_for_time_bias(df_hist.copy())
                         score = analyze_gross_return(df_zones)
-                        atr_val = calculate_atr(df_hist.copy())
+                        atr_val = calculate_atr(velas.high, velas.low, velas.close)
 
                         st.metric("Score (Gross Return KZ)", f"{score:.4f}")
                         st.metric("ATR (última vela)", f"${atr_val:.4f}")
@@ -201,16 +201,15 @@ with col1:
                         fig = go.Figure()
                         fig.add_trace(go.Scatter(x=df_hist['timestamp'], y=df_hist['close'], name='Close', line=dict(color='#0b7fda', width=2)))
                         # Añadir sombreado para kill zones
-                        kz = df_zones[df_zones['is_kill_zone'] == True]
-                        if not kz.empty:
-                            for idx, row in kz.iterrows():
-                                fig.add_vrect(x0=row['timestamp'], x1=row['timestamp'], fillcolor='LightSalmon', opacity=0.3, line_width=0)
+                        # 'is_kill_zone' ya es booleana: se usa directamente como máscara (sin '== True' ni iterrows)
+                        for ts in df_zones.loc[df_zones['is_kill_zone'].to_numpy(), 'timestamp']:
+                            fig.add_vrect(x0=ts, x1=ts, fillcolor='LightSalmon', opacity=0.3, line_width=0)
 
                         fig.update_layout(title=f"Precio Close - {selected_symbol}", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#02122b'))
                         st.plotly_chart(fig, use_container_width=True)
 
                         if st.button("Simular Trade usando score y ATR"):
-                            execute_trade_simulation(selected_symbol.replace('_', '/'), score, atr_multiplier, df_hist)
+                            execute_trade_simulation(selected_symbol.replace('_', '/'), score, atr_multiplier, velas)
                             st.success("Simulación ejecutada — revisar posiciones abiertas.")
 
 with col2:
@@ -218,8 +217,8 @@ with col2:
     # Intentar cargar posiciones usando la función del módulo si está disponible
     if os.path.exists('open_positions.json'):
         try:
-            with open('open_positions.json', 'r') as f:
-                positions = json.load(f)
+            with open('open_positions.json', 'rb') as f:
+                positions = json.loads(f.read())
         except Exception:
             positions = []
     else:
@@ -9,8 +9,8 @@ def audit_drawdown():
         print("❌ No hay datos bancarios para auditar.")
         return
 
-    with open(BANK_FILE, 'r') as f:
-        data = json.load(f)
+    with open(BANK_FILE, 'rb') as f:
+        data = json.loads(f.read())
         current_balance = data.get('balance', INITIAL_CAPITAL)
 
     # Cálculo de métricas
@@ -1,35 +1,80 @@
 import telebot 
 import threading 
+from concurrent.futures import ThreadPoolExecutor
 import ccxt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from dotenv import load_dotenv
 import pandas as pd
-import pytz
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timezone
 import time
-import ta.volatility
-import json
+import math
+import signal
+import orjson
+import tempfile
+import gzip
+import shutil
+import atexit
+from collections import OrderedDict, deque
+import csv
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from dataclasses import dataclass, asdict, field
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Set, Deque
+
+# Superficie pública del módulo (lo que usan el dashboard y los scripts auxiliares)
+__all__ = [
+    'TARGET_ASSETS', 'SYMBOL_PRECISION', 'KILL_ZONE_START', 'KILL_ZONE_END', 'OPEN_POSITIONS', 'CLOSED_TRADES',
+    'Position', 'OHLCV', 'TradingAuditor',
+    'setup_logging', 'enviar_telegram', 'get_virtual_balance', 'update_virtual_balance',
+    'load_open_positions', 'save_open_positions', 'request_save_open_positions', 'append_closed_trades',
+    'initialize_kraken_exchange', 'fetch_recent_ohlcv', 'fetch_recent_data', 'fetch_last_prices',
+    'prefetch_recent_data', 'preprocess_data_for_time_bias', 'mark_kill_zones', 'kill_zone_stats',
+    'estratega_no_supervisado', 'analyze_gross_return', 'analyze_symbol', 'calculate_atr',
+    'calculate_exit_levels', 'is_in_kill_zone', 'execute_live_trade', 'execute_trade_simulation',
+    'monitor_and_close_positions', 'run_trading_cycle', 'run_initial_cycle', 'trading_loop',
+    'print_final_trade_report', 'main',
+]
+
+# Logger del módulo: los mensajes se propagan al root configurado por setup_logging
+log = logging.getLogger(__name__)
 
 
 BANK_FILE = 'virtual_bank.json'
 
-def get_virtual_balance():
+# El bot es el único que escribe el banco: tras la primera lectura el saldo vive en memoria
+_BALANCE_CACHE: Optional[float] = None
+_BALANCE_LOCK = threading.Lock()
+
+def _read_virtual_balance():
     try:
-        with open(BANK_FILE, 'r') as f:
-            data = json.load(f)
+        with open(BANK_FILE, 'rb') as f:
+            data = orjson.loads(f.read())
             return data.get('balance', 500.0)
     except FileNotFoundError:
         return 500.0
 
+def get_virtual_balance():
+    global _BALANCE_CACHE
+    if _BALANCE_CACHE is None:
+        with _BALANCE_LOCK:
+            if _BALANCE_CACHE is None:
+                _BALANCE_CACHE = _read_virtual_balance()
+    return _BALANCE_CACHE
+
 def update_virtual_balance(amount):
-    current = get_virtual_balance()
-    new_balance = current + amount
-    with open(BANK_FILE, 'w') as f:
-        json.dump({"balance": round(new_balance, 2)}, f)
+    global _BALANCE_CACHE
+    with _BALANCE_LOCK:
+        current = _BALANCE_CACHE if _BALANCE_CACHE is not None else _read_virtual_balance()
+        new_balance = current + amount
+        stored = round(float(new_balance), 2)
+        # Escritura atómica: un corte a mitad nunca deja el banco vacío o truncado
+        _write_atomic(BANK_FILE, orjson.dumps({"balance": stored}))
+        # La caché guarda exactamente lo que hay en disco
+        _BALANCE_CACHE = stored
     return new_balance
 
 # --- 1. CONFIGURACIÓN GLOBAL (Accesible para todas las funciones) ---
@@ -38,14 +83,155 @@ TOKEN = os.getenv('TELEGRAM_TOKEN')
 CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 bot = telebot.TeleBot(TOKEN)
 
+# Salida a Telegram desacoplada: los productores encolan y un único hilo agrupa
+# los mensajes de cada ráfaga en un solo send_message (evita 429 y latencia en los ciclos).
+# La cola está acotada: si Telegram no responde, los ciclos no acumulan memoria sin límite
+TG_QUEUE_MAXSIZE = 256
+TG_OUT = queue.Queue(maxsize=TG_QUEUE_MAXSIZE)
+TG_COALESCE_SECONDS = 1.0
+TG_MAX_MESSAGE_LEN = 4096
+_TG_WORKER = None
+_TG_WORKER_LOCK = threading.Lock()
+
+def _drain_telegram_queue(first):
+    parts = [first]
+    while True:
+        try:
+            parts.append(TG_OUT.get_nowait())
+        except queue.Empty:
+            return parts
+
+def _send_telegram_text(text):
+    """Envía un mensaje con Markdown; si Telegram lo rechaza, lo reintenta como texto plano."""
+    try:
+        bot.send_message(CHAT_ID, text, parse_mode='Markdown')
+        return
+    except Exception as e:
+        log.warning("Telegram rechazó el mensaje con Markdown (%s); se reenvía sin formato.", e)
+    try:
+        bot.send_message(CHAT_ID, text)
+    except Exception as e:
+        log.error("Error enviando mensaje a Telegram: %s", e)
+
+def _send_telegram_batch(parts):
+    # Se agrupan sin superar el límite de longitud de Telegram
+    batch = []
+    size = 0
+    for part in parts + [None]:
+        if part is None or (batch and size + len(part) + 2 > TG_MAX_MESSAGE_LEN):
+            try:
+                bot.send_message(CHAT_ID, "\n\n".join(batch), parse_mode='Markdown')
+            except Exception as e:
+                # Un Markdown roto en un mensaje no debe arrastrar al resto del lote:
+                # se reenvían uno a uno, cada uno con su propio respaldo sin formato
+                log.warning("Telegram rechazó un lote de %d mensajes (%s); se reenvían por separado.", len(batch), e)
+                for text in batch:
+                    _send_telegram_text(text)
+            batch, size = [], 0
+        if part is not None:
+            batch.append(part)
+            size += len(part) + 2
+
+def telegram_worker():
+    while True:
+        first = TG_OUT.get()
+        time.sleep(TG_COALESCE_SECONDS)
+        _send_telegram_batch(_drain_telegram_queue(first))
+
+def _flush_telegram_queue():
+    try:
+        first = TG_OUT.get_nowait()
+    except queue.Empty:
+        return
+    _send_telegram_batch(_drain_telegram_queue(first))
+
+def enviar_telegram(msg):
+    """Encola un mensaje para el chat del bot; el envío lo hace el hilo telegram_worker."""
+    global _TG_WORKER
+    if _TG_WORKER is None:
+        with _TG_WORKER_LOCK:
+            if _TG_WORKER is None:
+                _TG_WORKER = threading.Thread(target=telegram_worker, name='telegram-worker', daemon=True)
+                _TG_WORKER.start()
+                atexit.register(_flush_telegram_queue)
+    try:
+        TG_OUT.put_nowait(msg)
+    except queue.Full:
+        # Nunca se bloquea el ciclo de trading por Telegram: el mensaje se descarta
+        log.warning("Cola de Telegram llena (%d); mensaje descartado.", TG_QUEUE_MAXSIZE)
+
 # Variables de Control
 trading_active = False 
+# Apagado limpio: despierta al instante los bucles que esperan entre ciclos
+STOP_EVENT = threading.Event()
+CYCLE_SECONDS = 900
+MONITOR_SECONDS = 60
 TARGET_ASSETS = ['BTC/USD', 'ADA/USD', 'XRP/USD', 'SOL/USD', 'ETH/USD', 'LTC/USD', 'DOT/USD', 'BCH/USD', 'UNI/USD', 'LINK/USD']
+# Moneda base de cada activo, resuelta una vez ('BTC/USD' -> 'BTC')
+BASE_CCY = {s: s.split('/', 1)[0] for s in TARGET_ASSETS}
+# Decimales de SL/TP por activo (los de precio unitario bajo necesitan más precisión)
+SYMBOL_PRECISION = {
+    'BTC/USD': 2, 'ETH/USD': 2, 'BCH/USD': 2, 'LTC/USD': 2, 'SOL/USD': 2,
+    'DOT/USD': 4, 'ADA/USD': 4, 'XRP/USD': 4, 'UNI/USD': 4, 'LINK/USD': 4,
+}
 OPTIMAL_ATR_MULTIPLIER = 0.05
+# Parámetros de Riesgo/Recompensa (R:R 1:2) sobre el ATR
+SL_ATR_MULTIPLIER = 1.5
+TP_ATR_MULTIPLIER = 3.0
 HOURS_TO_ANALYZE = 50
 
+LOG_FILE = 'kraken.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+_LOG_LISTENER = None
+
+def _namer(default_name):
+    return default_name + '.gz'
+
+def _rotator(source, dest):
+    # Nivel 1: los logs de texto comprimen casi igual y la rotación no frena al listener
+    with open(source, 'rb') as sf, gzip.open(dest, 'wb', compresslevel=1) as df:
+        shutil.copyfileobj(sf, df)
+    os.remove(source)
+
+def setup_logging(level=logging.INFO):
+    """
+    Los hilos de trading solo encolan el registro (QueueHandler); un QueueListener
+    en segundo plano es el único que escribe en disco (rotación diaria) y en consola.
+    """
+    global _LOG_LISTENER
+    root = logging.getLogger()
+    if _LOG_LISTENER is not None or root.handlers:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = TimedRotatingFileHandler(LOG_FILE, when='midnight', utc=True, encoding='utf-8')
+    file_handler.namer = _namer
+    file_handler.rotator = _rotator
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    _LOG_LISTENER = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _LOG_LISTENER.start()
+    atexit.register(_LOG_LISTENER.stop)
+    # El QueueHandler solo resuelve los argumentos; el formato final lo aplica el listener
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=level, handlers=[queue_handler])
+
 OPEN_POSITIONS: List[Dict[str, Any]] = []
-CLOSED_TRADES: List[Dict[str, Any]] = []
+# Índice de símbolos con posición abierta (se mantiene junto a OPEN_POSITIONS)
+_OPEN_SYMBOLS: Set[str] = set()
+# El hilo de vigilancia cierra posiciones mientras el ciclo principal abre otras:
+# toda modificación de OPEN_POSITIONS/_OPEN_SYMBOLS pasa por este lock
+_POSITIONS_LOCK = threading.Lock()
+# En memoria solo los últimos cierres; el histórico completo se añade a CLOSED_TRADES_FILE
+CLOSED_TRADES_MAXLEN = 500
+CLOSED_TRADES_FILE = 'closed_trades.csv'
+CLOSED_TRADE_FIELDS = ['symbol', 'direction', 'entry_price', 'amount_base', 'stop_loss', 'take_profit',
+                       'open_time', 'exit_price', 'exit_reason', 'pnl_usd']
+CLOSED_TRADES: Deque[Dict[str, Any]] = deque(maxlen=CLOSED_TRADES_MAXLEN)
 POSITIONS_FILE = 'open_positions.json'
 
 
@@ -56,13 +242,13 @@ class TradingAuditor:
         self.max_simultaneous = max_simultaneous
         self.daily_loss_limit = daily_loss_limit
 
-    def check_safety(self, symbol, current_positions, current_balance):
-        # Evitamos la "metralleta" de 273 órdenes
-        if len(current_positions) >= self.max_simultaneous:
+    def check_safety(self, symbol, open_symbols, current_balance):
+        # Evitamos la "metralleta" de 273 órdenes (una posición por símbolo como máximo)
+        if len(open_symbols) >= self.max_simultaneous:
             return False, f"Límite de {self.max_simultaneous} posiciones alcanzado."
         
-        # --- CORRECCIÓN AQUÍ: Cambiamos p['symbol'] por p.symbol ---
-        if any(p.symbol == symbol for p in current_positions):
+        # Pertenencia O(1) sobre el conjunto de símbolos abiertos
+        if symbol in open_symbols:
             return False, f"Ya operando {symbol}."
             
         # Stop Loss Global: Protegemos los $500
@@ -71,14 +257,41 @@ class TradingAuditor:
 
         return True, "OK"
 
-def estratega_no_supervisado(df):
+def kill_zone_stats(df):
+    """
+    Medias por grupo (índice 0 = fuera de la Kill Zone, 1 = dentro) en una sola pasada:
+    count, gross_return_mean (close-open), body_mean (|close-open|) y range_mean.
+    Un grupo vacío tiene media NaN.
+    """
+    return _kill_zone_stats(df['is_kill_zone'].to_numpy(dtype=bool), df['open'].to_numpy(),
+                            df['close'].to_numpy(), df['candle_range'].to_numpy())
+
+def _kill_zone_stats(is_kill_zone, open_, close, candle_range):
+    """Núcleo de kill_zone_stats sobre arrays NumPy (sin DataFrame)."""
+    group = is_kill_zone.astype(np.intp)
+    gross_return = close - open_
+    count = np.bincount(group, minlength=2)
+
+    def _mean(values):
+        sums = np.bincount(group, weights=values, minlength=2)
+        return np.divide(sums, count, out=np.full(2, np.nan), where=count > 0)
+
+    return {
+        'count': count,
+        'gross_return_mean': _mean(gross_return),
+        'body_mean': _mean(np.abs(gross_return)),
+        'range_mean': _mean(candle_range),
+    }
+
+def estratega_no_supervisado(df=None, stats=None):
     """ Busca patrones de 'ruido' vs 'tendencia' """
-    kz_data = df[df['is_kill_zone'] == True]
-    if len(kz_data) < 2: return "NEUTRAL"
+    if stats is None:
+        stats = kill_zone_stats(df)
+    if stats['count'][1] < 2: return "NEUTRAL"
 
     # Calculamos la 'limpieza' del movimiento
-    cuerpo_promedio = (kz_data['close'] - kz_data['open']).abs().mean()
-    rango_promedio = kz_data['candle_range'].mean()
+    cuerpo_promedio = stats['body_mean'][1]
+    rango_promedio = stats['range_mean'][1]
     coherencia = cuerpo_promedio / rango_promedio if rango_promedio > 0 else 0
 
     if coherencia > 0.6: return "TENDENCIA_SOLIDA"
@@ -89,7 +302,7 @@ def estratega_no_supervisado(df):
 auditor = TradingAuditor(max_simultaneous=3, daily_loss_limit=25.0)
 
 # --- 2. MODELO DE DATOS (Tu estructura original) ---
-@dataclass
+@dataclass(slots=True)
 class Position:
     symbol: str
     direction: str
@@ -98,7 +311,7 @@ class Position:
     stop_loss: Optional[float]
     take_profit: Optional[float]
     status: str
-    open_time: Any = field(default_factory=lambda: datetime.now(pytz.utc))
+    open_time: Any = field(default_factory=lambda: datetime.now(timezone.utc))
 
     def to_dict(self) -> Dict[str, Any]:
         d = asdict(self)
@@ -108,88 +321,161 @@ class Position:
 
 # --- 3. PERSISTENCIA Y LOGS ---
 def load_open_positions():
-    global OPEN_POSITIONS
+    # El archivo ya contiene dicts con open_time en ISO: se cargan tal cual, sin pasar por Position
+    # Se sustituye el contenido (no la lista) para que los módulos que la importaron la vean
     if os.path.exists(POSITIONS_FILE):
         try:
-            with open(POSITIONS_FILE, 'r') as f:
-                OPEN_POSITIONS = json.load(f)
-        except: OPEN_POSITIONS = []
+            with open(POSITIONS_FILE, 'rb') as f:
+                positions = orjson.loads(f.read())
+        except:
+            positions = []
+        with _POSITIONS_LOCK:
+            OPEN_POSITIONS[:] = positions
+            _OPEN_SYMBOLS.clear()
+            _OPEN_SYMBOLS.update(p['symbol'] for p in positions)
+
+def append_closed_trades(trades):
+    """Añade los cierres al CSV histórico (solo append: nunca se reescribe lo anterior)."""
+    write_header = not os.path.exists(CLOSED_TRADES_FILE)
+    with open(CLOSED_TRADES_FILE, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CLOSED_TRADE_FIELDS, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        writer.writerows(trades)
+
+def _add_open_position(pos):
+    """Registra la posición salvo que su símbolo ya esté abierto; devuelve si se añadió."""
+    with _POSITIONS_LOCK:
+        if pos['symbol'] in _OPEN_SYMBOLS:
+            return False
+        OPEN_POSITIONS.append(pos)
+        _OPEN_SYMBOLS.add(pos['symbol'])
+    return True
+
+def _json_default(obj):
+    # Timestamps de pandas y similares: ISO 8601; cualquier otro tipo, como texto
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+# umask del proceso, leído una vez al importar (os.umask solo se puede consultar cambiándolo)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _target_mode(path):
+    """Permisos que debe conservar 'path' al reemplazarlo (los de un archivo nuevo si no existe)."""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
 
-def save_open_positions():
-    with open(POSITIONS_FILE, 'w') as f:
-        json.dump(OPEN_POSITIONS, f, indent=4, default=str)
+def _write_temp(path, payload):
+    """Escribe bytes en un temporal del mismo directorio (con fsync) y devuelve su ruta."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        # mkstemp crea el temporal con 0600 y os.replace lo conservaría: el dashboard y la API
+        # (quizá con otro usuario) dejarían de poder leer el archivo
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, _target_mode(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+def _fsync_dir(path):
+    """Persiste la entrada de directorio tras os.replace (POSIX; en Windows no aplica)."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
-# --- 4. LÓGICA DE TRADING (Respetando tu Bloc de Notas) ---
+def _write_atomic(path, payload):
+    """Escribe bytes en un temporal, fsync y os.replace (atómico)."""
+    tmp_path = _write_temp(path, payload)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _fsync_dir(path)
 
-def calculate_exit_levels(symbol, entry_price, atr_value, direction):
-    # Mejora de precisión para evitar cierres erróneos en UNI/ADA
-    precision = 4 if entry_price < 10 else 2
-    risk_amount = atr_value * 1.5
-    profit_amount = atr_value * 3.0
+_SAVE_LOCK = threading.Lock()
+_SAVE_SEQ = 0
+_LAST_SAVED_SEQ = 0
 
-    if direction == "LONG (COMPRA)":
-        sl, tp = entry_price - risk_amount, entry_price + profit_amount
+def save_open_positions():
+    global _SAVE_SEQ, _LAST_SAVED_SEQ
+    # Bajo el lock solo se copia la lista de referencias y se numera la foto
+    with _SAVE_LOCK:
+        snapshot = OPEN_POSITIONS.copy()
+        _SAVE_SEQ += 1
+        seq = _SAVE_SEQ
+
+    # Serialización y escritura fuera del lock: OPEN_POSITIONS ya son dicts
+    payload = orjson.dumps(snapshot, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    tmp_path = _write_temp(POSITIONS_FILE, payload)
+
+    # Si otro hilo ya publicó una foto más reciente, la nuestra se descarta
+    with _SAVE_LOCK:
+        if seq > _LAST_SAVED_SEQ:
+            os.replace(tmp_path, POSITIONS_FILE)
+            _LAST_SAVED_SEQ = seq
+            published = True
+        else:
+            published = False
+    if published:
+        _fsync_dir(POSITIONS_FILE)
     else:
-        sl, tp = entry_price + risk_amount, entry_price - profit_amount
-    return round(sl, precision), round(tp, precision)
+        os.unlink(tmp_path)
 
-def execute_trade_simulation(symbol, bias_score, atr_multiplier_value, historical_data): 
-    global OPEN_POSITIONS
-    # FILTRO ANTI-DUPLICADOS
-    if any(p['symbol'] == symbol for p in OPEN_POSITIONS): return
+# Guardado diferido: un único hilo daemon de larga vida agrupa ráfagas de cambios
+SAVE_DEBOUNCE_SECONDS = 2.0
+_SAVE_REQUESTED = threading.Event()
+_FLUSHER_THREAD = None
+_FLUSHER_START_LOCK = threading.Lock()
 
-    entry_price = historical_data['close'].iloc[-1] 
-    atr_value = ta.volatility.average_true_range(historical_data['high'], historical_data['low'], historical_data['close'], window=20).iloc[-1]
-    
-    threshold = atr_value * atr_multiplier_value 
-    direction = "LONG (COMPRA)" if bias_score > threshold else "SHORT (VENTA)" if bias_score < -threshold else None
+def _flush_worker():
+    while True:
+        _SAVE_REQUESTED.wait()
+        time.sleep(SAVE_DEBOUNCE_SECONDS)
+        _SAVE_REQUESTED.clear()
+        try:
+            save_open_positions()
+        except Exception as e:
+            log.error("Error guardando posiciones abiertas: %s", e)
 
-    if direction:
-        sl, tp = calculate_exit_levels(symbol, entry_price, atr_value, direction)
-        pos = Position(symbol=symbol, direction=direction, entry_price=entry_price, 
-                       amount_base=100/entry_price, stop_loss=sl, take_profit=tp, status='OPEN')
-        OPEN_POSITIONS.append(pos.to_dict())
+def _flush_pending_save():
+    # Al salir, se escribe lo que el hilo aún no haya volcado
+    if _SAVE_REQUESTED.is_set():
+        _SAVE_REQUESTED.clear()
         save_open_positions()
-        bot.send_message(CHAT_ID, f"🟢 *NUEVA ORDEN*\n{symbol} | {direction}\nEntrada: ${entry_price:.2f}\nSL: ${sl}")
+
+def request_save_open_positions():
+    """Marca las posiciones como modificadas; el hilo de fondo las guarda tras el debounce."""
+    global _FLUSHER_THREAD
+    if _FLUSHER_THREAD is None:
+        with _FLUSHER_START_LOCK:
+            if _FLUSHER_THREAD is None:
+                _FLUSHER_THREAD = threading.Thread(target=_flush_worker, name='positions-flusher', daemon=True)
+                _FLUSHER_THREAD.start()
+                atexit.register(_flush_pending_save)
+    _SAVE_REQUESTED.set()
 
 # --- 5. COMANDOS TELEGRAM (Control de Usuario) ---
 
 # --- 2. LÓGICA DE CONTROL TEMPORAL (Basada en tu Backtesting) ---
-def is_in_kill_zone():
-    now_utc = datetime.now(pytz.utc).hour
-    return KILL_ZONE_START <= now_utc < KILL_ZONE_END
-
-# --- 3. EL MOTOR DE EJECUCIÓN (Corregido) ---
-def run_trading_cycle(exchange):
-    """
-    Esta es la única función que el bucle principal llamará.
-    """
-    global trading_active
-    
-    # A. Verificación de Ventana (Evita operar a las 21:00)
-    if not is_in_kill_zone():
-        logging.info(f"⏳ Fuera de Kill Zone ({KILL_ZONE_START}-{KILL_ZONE_END} UTC). Monitoreando cierres únicamente.")
-    else:
-        # Solo abrimos posiciones si estamos EN la hora y el bot está START
-        logging.info("[MODULO 1] Analizando aperturas...")
-        for symbol in TARGET_ASSETS:
-            execute_live_trade(exchange, symbol, OPTIMAL_ATR_MULTIPLIER, '1h', HOURS_TO_ANALYZE)
-
-    # B. Monitoreo de Cierres (Siempre activo si hay posiciones)
-    if OPEN_POSITIONS:
-        logging.info("[MODULO 2] Monitoreando SL/TP/Time Exit...")
-        real_current_prices = {}
-        for symbol in TARGET_ASSETS:
-            try:
-                ticker = exchange.fetch_ticker(symbol)
-                real_current_prices[symbol] = ticker['last']
-            except: continue
-        
-        monitor_and_close_positions(real_current_prices, exchange)
-    
-    # C. Reporte si se cerró algo
-    if CLOSED_TRADES:
-        print_final_trade_report()
+def is_in_kill_zone(now_utc=None):
+    # Los ciclos pasan su propia hora de referencia para no reconstruirla en cada helper
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    return bool((1 << now_utc.hour) & KZ_MASK)
 
 @bot.message_handler(commands=['start_trading'])
 def handle_start(message):
@@ -198,14 +484,14 @@ def handle_start(message):
         trading_active = True
         
         # --- NUEVA LÓGICA DE FEEDBACK INSTANTÁNEO ---
-        now_utc = datetime.now(pytz.utc)
+        now_utc = datetime.now(timezone.utc)
         current_hour = now_utc.hour
         
         status_msg = "🚀 *SISTEMA ACTIVADO*\n\n"
         status_msg += f"⏰ Hora actual: {now_utc.strftime('%H:%M')} UTC\n"
         status_msg += f"📅 Ventana: {KILL_ZONE_START}:00 - {KILL_ZONE_END}:00 UTC\n\n"
         
-        if KILL_ZONE_START <= current_hour < KILL_ZONE_END:
+        if (1 << current_hour) & KZ_MASK:
             status_msg += "✅ *ESTADO:* En ventana operativa. ¡Buscando entradas ahora mismo!"
         else:
             # Calculamos cuánto falta para las 14:00 (opcional, pero muy pro)
@@ -226,29 +512,46 @@ def run_trading_cycle(kraken):
     if not trading_active:
         return
 
+    # Una sola hora de referencia para todo el ciclo
+    cycle_now = datetime.now(timezone.utc)
+
+    # Fuera de la Kill Zone no se abre nada: ni descargas ni pipeline de análisis.
+    # El informe periódico (balance) se sigue enviando como señal de vida
+    if not is_in_kill_zone(cycle_now):
+        log.info("⏳ Fuera de Kill Zone (%s-%s UTC). Análisis omitido.", KILL_ZONE_START, KILL_ZONE_END)
+        enviar_informe_telegram({}, cycle_now, fuera_kz=True)
+        return
+
     # Diccionario para recolectar qué pasó con cada moneda en esta vuelta
     reporte_vuelta = {}
     
+    # Las velas se descargan en paralelo antes del análisis (salvo las de posiciones ya abiertas)
+    datos = prefetch_recent_data(kraken, [s for s in TARGET_ASSETS if s not in _OPEN_SYMBOLS], '1h', HOURS_TO_ANALYZE)
+
     # Lista de tus monedas: ADA, LINK, BCH, ETH, BTC, UNI, SOL, DOT
     for symbol in TARGET_ASSETS:
         try:
             # Capturamos el diccionario que devuelve execute_live_trade
-            resultado = execute_live_trade(kraken, symbol)
+            resultado = execute_live_trade(kraken, symbol, historical_data=datos.get(symbol))
             reporte_vuelta[symbol] = resultado
         except Exception as e:
             reporte_vuelta[symbol] = {"veredicto": f"ERROR: {str(e)[:10]}", "bias": 0}
 
     # Una vez analizadas todas, enviamos el informe único
-    enviar_informe_telegram(reporte_vuelta)
+    enviar_informe_telegram(reporte_vuelta, cycle_now)
 
 
-def enviar_informe_telegram(data_reporte):
-    ahora_utc = datetime.now(pytz.utc).strftime('%H:%M')
+def enviar_informe_telegram(data_reporte, now_utc=None, fuera_kz=False):
+    ahora_utc = (now_utc or datetime.now(timezone.utc)).strftime('%H:%M')
     balance = get_virtual_balance() # Para saber cómo va la cuenta
     
     msg = f"🛰️ **INFORME DE RADAR | {ahora_utc} UTC**\n"
     msg += f"💰 **Balance Virtual:** ${balance:.2f}\n"
     msg += "----------------------------------\n"
+    if fuera_kz:
+        msg += f"⏳ Fuera de Kill Zone ({KILL_ZONE_START}:00-{KILL_ZONE_END}:00 UTC): análisis en pausa.\n"
+
+    resumen_estados = {"ENTRADA": 0, "BLOQUEO": 0, "RUIDO": 0}
 
     for symbol, info in data_reporte.items():
         veredicto = info.get('veredicto', 'N/A')
@@ -257,10 +560,13 @@ def enviar_informe_telegram(data_reporte):
         # Asignamos emoji según el veredicto
         if "EJECUTADO" in veredicto:
             status = "✅ ENTRADA"
+            resumen_estados["ENTRADA"] += 1
         elif "AUDITOR" in veredicto:
             status = f"🛡️ BLOQUEO ({veredicto.split(':')[-1].strip()})"
+            resumen_estados["BLOQUEO"] += 1
         elif "RUIDO" in veredicto:
             status = "📉 RUIDO (Estratega)"
+            resumen_estados["RUIDO"] += 1
         elif "NEUTRAL" in veredicto:
             status = "⚪ NEUTRAL"
         else:
@@ -269,12 +575,10 @@ def enviar_informe_telegram(data_reporte):
         msg += f"**{symbol}**: {status} | Bias: `{bias:.2f}`\n"
 
     msg += "----------------------------------\n"
+    msg += f"📈 Resumen: {resumen_estados['ENTRADA']} ON | {resumen_estados['BLOQUEO']} BLOCK | {resumen_estados['RUIDO']} RUIDO\n"
     msg += "🧐 *Estado: Vigilando mercado...*"
     
-    try:
-        bot.send_message(CHAT_ID, msg, parse_mode='Markdown')
-    except Exception as e:
-        print(f"Error Telegram: {e}")
+    enviar_telegram(msg)
 
 
 @bot.message_handler(commands=['stop_trading'])
@@ -294,7 +598,7 @@ def handle_report_request(message):
         if not is_in_kill_zone():
             status_prefix = "🏁 *REPORTE DE JORNADA FINALIZADA*\n"
             
-        bot.send_message(CHAT_ID, "📊 Generando auditoría solicitada...")
+        enviar_telegram("📊 Generando auditoría solicitada...")
         print_final_trade_report(custom_prefix=status_prefix)
     else:
         bot.reply_to(message, "❌ No autorizado.")
@@ -355,78 +659,81 @@ def handle_status(message):
 def run_initial_cycle():
     """Ejecuta execute_live_trade para cada activo del TARGET_ASSETS global"""
     if not trading_active: return
+    if not is_in_kill_zone():
+        log.info("⏳ Fuera de Kill Zone (%s-%s UTC). Análisis omitido.", KILL_ZONE_START, KILL_ZONE_END)
+        return
+    # Las descargas OHLCV se solapan en paralelo; el análisis y las aperturas siguen en serie
+    datos = prefetch_recent_data(kraken, [s for s in TARGET_ASSETS if s not in _OPEN_SYMBOLS], '1h', HOURS_TO_ANALYZE)
     for symbol in TARGET_ASSETS:
         try:
             # Aquí llamamos a tu función original del bloc de notas
-            execute_live_trade(kraken, symbol, OPTIMAL_ATR_MULTIPLIER, '1h', HOURS_TO_ANALYZE)
+            execute_live_trade(kraken, symbol, OPTIMAL_ATR_MULTIPLIER, '1h', HOURS_TO_ANALYZE,
+                               historical_data=datos.get(symbol))
         except Exception as e:
-            logging.error(f"Error en {symbol}: {e}")
-
+            log.error("Error en %s: %s", symbol, e)
 
-def enviar_reporte_consolidado(diagnostico_total):
-    """
-    Recibe un diccionario con los resultados de todos los activos 
-    y envía UN SOLO mensaje de Telegram.
-    """
-    ahora_utc = datetime.now(pytz.utc).strftime('%H:%M')
-    informe = f"📊 **REPORTE DE CICLO - {ahora_utc} UTC**\n"
-    informe += "----------------------------------\n"
-    
-    resumen_estados = {"ENTRADA": 0, "BLOQUEO": 0, "RUIDO": 0}
 
-    for symbol, info in diagnostico_total.items():
-        # Emoji y estado según el veredicto
-        if info['veredicto'] == "EJECUTADO":
-            emoji = "✅"
-            resumen_estados["ENTRADA"] += 1
-            detalle = "Orden enviada"
-        elif "AUDITOR" in info['veredicto']:
-            emoji = "🛡️"
-            resumen_estados["BLOQUEO"] += 1
-            detalle = info['veredicto'].split(":")[1] # El motivo del auditor
-        elif info['veredicto'] == "RUIDO":
-            emoji = "📉"
-            resumen_estados["RUIDO"] += 1
-            detalle = "Ruido/Mechas"
-        else:
-            emoji = "⚪"
-            detalle = "Sin Sesgo/Neutral"
+@dataclass
+class OHLCV:
+    """Velas OHLCV como columnas NumPy contiguas (timestamp en ms epoch)."""
+    ts: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    @classmethod
+    def from_ccxt(cls, ohlcv):
+        # Una sola conversión de la lista de listas de ccxt a un bloque float64
+        arr = np.asarray(ohlcv, dtype=np.float64)
+        return cls(ts=arr[:, 0].astype(np.int64), open=arr[:, 1], high=arr[:, 2],
+                   low=arr[:, 3], close=arr[:, 4], volume=arr[:, 5])
+
+    def merge(self, newer, limit):
+        """Sustituye desde el primer timestamp de 'newer' y conserva las últimas 'limit' velas."""
+        cut = np.searchsorted(self.ts, newer.ts[0])
+        cols = {name: np.concatenate((getattr(self, name)[:cut], getattr(newer, name)))[-limit:]
+                for name in ('ts', 'open', 'high', 'low', 'close', 'volume')}
+        return OHLCV(**cols)
+
+    def hour_utc(self):
+        """Hora UTC (0-23) de cada vela, directamente del epoch en ms."""
+        return (self.ts // 3_600_000) % 24
+
+    def to_frame(self):
+        """Adaptador para el pipeline de pandas (análisis y dashboard)."""
+        return pd.DataFrame({
+            # Reinterpretación sin copia: epoch en ms int64 == datetime64[ms]
+            'timestamp': self.ts.view('datetime64[ms]'),
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+        })
 
-        informe += f"{emoji} **{symbol}**: {detalle}\n"
 
-    informe += "----------------------------------\n"
-    informe += f"📈 Resumen: {resumen_estados['ENTRADA']} ON | {resumen_estados['BLOQUEO']} BLOCK | {resumen_estados['RUIDO']} RUIDO"
-    
-    try:
-        bot.send_message(CHAT_ID, informe, parse_mode='Markdown')
-    except Exception as e:
-        logging.error(f"Error enviando informe: {e}")
+# Última ventana descargada por (symbol, timeframe, limit): las velas cerradas no cambian
+_OHLCV_CACHE: Dict[tuple, 'OHLCV'] = {}
 
-# --- 6. BUCLE PRINCIPAL ---
-
-def trading_loop(exchange):
-    while True:
-        if trading_active:
-            try:
-                # Monitoreo de precios para cerrar posiciones
-                prices = {}
-                for symbol in TARGET_ASSETS:
-                    ticker = exchange.fetch_ticker(symbol)
-                    prices[symbol] = ticker['last']
-                
-                # Tu función monitor_and_close original
-                monitor_and_close_positions(prices, exchange)
-            except Exception as e:
-                logging.error(f"Error en loop: {e}")
-        time.sleep(60)
-
-# NUEVA FUNCIÓN (o adaptación)
-def fetch_recent_data(exchange, symbol='BTC/USD', timeframe='1h', limit=50):
+def fetch_recent_ohlcv(exchange, symbol='BTC/USD', timeframe='1h', limit=50):
     """
-    Descarga el número limitado (N) de velas históricas más recientes.
-    Recomendado para análisis en tiempo real.
+    Descarga las N velas más recientes y las devuelve como arrays NumPy (OHLCV),
+    sin pasar por la inferencia de tipos de pandas.
+    Si ya hay una ventana en caché solo se piden las velas desde la penúltima
+    (la última cerrada y la vela en curso) y se fusionan con las anteriores.
     """
+    key = (symbol, timeframe, limit)
+    cached = _OHLCV_CACHE.get(key)
     try:
+        if cached is not None and len(cached.ts) >= 2:
+            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=int(cached.ts[-2]))
+            if ohlcv:
+                result = cached.merge(OHLCV.from_ccxt(ohlcv), limit)
+                _OHLCV_CACHE[key] = result
+                return result
+
         # ccxt por defecto usa el parámetro 'limit' para obtener las velas más recientes.
         ohlcv = exchange.fetch_ohlcv(
             symbol, 
@@ -435,50 +742,126 @@ def fetch_recent_data(exchange, symbol='BTC/USD', timeframe='1h', limit=50):
         )
         
         if not ohlcv:
-            logging.warning(f"No se obtuvieron datos recientes para {symbol}.")
+            log.warning("No se obtuvieron datos recientes para %s.", symbol)
             return None
             
-        # 4. Compilación de Datos en un único DataFrame
-        headers = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
-        df = pd.DataFrame(ohlcv, columns=headers)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        
-        return df
+        result = OHLCV.from_ccxt(ohlcv)
+        _OHLCV_CACHE[key] = result
+        return result
         
     except Exception as e:
-        logging.error(f"Error al obtener datos recientes para {symbol}: {e}")
+        log.error("Error al obtener datos recientes para %s: %s", symbol, e)
         return None
+
+
+# NUEVA FUNCIÓN (o adaptación)
+def fetch_recent_data(exchange, symbol='BTC/USD', timeframe='1h', limit=50):
+    """
+    Descarga el número limitado (N) de velas históricas más recientes como DataFrame.
+    Pensado para gráficos e informes; el análisis en vivo usa fetch_recent_ohlcv.
+    """
+    ohlcv = fetch_recent_ohlcv(exchange, symbol, timeframe, limit)
+    if ohlcv is None:
+        return None
+
+    # Compilación de Datos en un único DataFrame a partir de las columnas NumPy
+    return ohlcv.to_frame()
+
+
+def fetch_last_prices(exchange, symbols):
+    """
+    Obtiene el último precio de varios símbolos con una sola llamada REST
+    (fetch_tickers) en lugar de un fetch_ticker por símbolo.
+    Si el exchange no soporta el endpoint agrupado, se cae al bucle por símbolo.
+    """
+    if exchange.has.get('fetchTickers'):
+        tickers = exchange.fetch_tickers(symbols)
+        return {s: tickers[s]['last'] for s in symbols if s in tickers}
+
+    prices = {}
+    for symbol in symbols:
+        try:
+            prices[symbol] = exchange.fetch_ticker(symbol)['last']
+        except Exception as e:
+            log.warning("Sin ticker para %s: %s", symbol, e)
+    return prices
+
+
+def prefetch_recent_data(exchange, symbols, timeframe='1h', limit=50):
+    """
+    Descarga en paralelo las velas de varios símbolos para solapar la latencia de red.
+    Devuelve {symbol: OHLCV o None}: el análisis en vivo no necesita DataFrames.
+    """
+    if not symbols:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(symbols)) as pool:
+        frames = pool.map(lambda s: fetch_recent_ohlcv(exchange, s, timeframe, limit), symbols)
+        return dict(zip(symbols, frames))
     
 
-def execute_live_trade(kraken, symbol, atr_multiplier=0.05, timeframe='1h', hours_to_analyze=50):
+# Memo del análisis por vela: las velas cerradas no cambian, así que la última fila
+# (timestamp + high/low/close) identifica el resultado del pipeline completo
+ANALYSIS_CACHE_SIZE = 512
+_ANALYSIS_CACHE = OrderedDict()
+_ANALYSIS_CACHE_LOCK = threading.Lock()
+
+def analyze_symbol(symbol, candles):
+    """
+    Devuelve (estado_mercado, bias_score, atr_value) a partir de las velas OHLCV,
+    recalculando solo si la vela cambió.
+    """
+    key = (symbol, len(candles.ts), int(candles.ts[-1]),
+           float(candles.high[-1]), float(candles.low[-1]), float(candles.close[-1]))
+    with _ANALYSIS_CACHE_LOCK:
+        cached = _ANALYSIS_CACHE.get(key)
+        if cached is not None:
+            _ANALYSIS_CACHE.move_to_end(key)
+            return cached
+
+    # Hora UTC, rango y Kill Zone directamente sobre los arrays: sin construir DataFrame
+    stats = _kill_zone_stats(_kill_zone_mask(candles.hour_utc()), candles.open,
+                             candles.close, candles.high - candles.low)
+    result = (estratega_no_supervisado(stats=stats),
+              analyze_gross_return(stats=stats),
+              calculate_atr(candles.high, candles.low, candles.close))
+
+    with _ANALYSIS_CACHE_LOCK:
+        _ANALYSIS_CACHE[key] = result
+        if len(_ANALYSIS_CACHE) > ANALYSIS_CACHE_SIZE:
+            _ANALYSIS_CACHE.popitem(last=False)
+    return result
+
+def execute_live_trade(kraken, symbol, atr_multiplier=0.05, timeframe='1h', hours_to_analyze=50, historical_data=None):
     global OPEN_POSITIONS, trading_active
     
     if not trading_active: 
         return {"veredicto": "STOPPED"}
 
-    historical_data = fetch_recent_data(kraken, symbol, timeframe, limit=hours_to_analyze)
-    if historical_data is None or historical_data.empty: 
+    # Con la posición ya abierta el auditor la rechazaría igual: ni velas ni análisis
+    if symbol in _OPEN_SYMBOLS:
+        return {"veredicto": f"AUDITOR: Ya operando {symbol}.", "bias": 0}
+
+    # Si el ciclo ya descargó las velas (prefetch_recent_data) no se vuelven a pedir
+    if historical_data is None:
+        historical_data = fetch_recent_ohlcv(kraken, symbol, timeframe, limit=hours_to_analyze)
+    if historical_data is None or len(historical_data.ts) == 0: 
         return {"veredicto": "ERROR_DATA"}
 
-    processed_data = preprocess_data_for_time_bias(historical_data)
-    data_with_zones = mark_kill_zones(processed_data)
-    
-    # --- PASO 1: EL ESTRATEGA ---
-    estado_mercado = estratega_no_supervisado(data_with_zones)
-    bias_score = analyze_gross_return(data_with_zones)
+    # --- PASO 1: EL ESTRATEGA --- (memoizado mientras la vela no cambie)
+    estado_mercado, bias_score, atr_value = analyze_symbol(symbol, historical_data)
     
     # --- PASO 2: EL AUDITOR ---
     balance_actual = get_virtual_balance()
-    is_safe, reason = auditor.check_safety(symbol, OPEN_POSITIONS, balance_actual)
+    is_safe, reason = auditor.check_safety(symbol, _OPEN_SYMBOLS, balance_actual)
 
     # --- LÓGICA DE RETORNO PARA EL INFORME ---
     
     if not is_safe:
-        logging.info(f"🛡️ AUDITOR: {reason}")
+        log.info("🛡️ AUDITOR: %s", reason)
         return {"veredicto": f"AUDITOR: {reason}", "bias": bias_score}
 
     if estado_mercado == "RUIDO_LATERAL":
-        logging.info(f"📉 ESTRATEGA: Mercado errático en {symbol}.")
+        log.info("📉 ESTRATEGA: Mercado errático en %s.", symbol)
         return {"veredicto": "RUIDO", "bias": bias_score}
 
     # Si pasa los filtros, evaluamos si el Bias es suficiente para entrar
@@ -488,7 +871,7 @@ def execute_live_trade(kraken, symbol, atr_multiplier=0.05, timeframe='1h', hour
 
     # EJECUCIÓN
     try:
-        execute_trade_simulation(symbol, bias_score, atr_multiplier, historical_data)
+        execute_trade_simulation(symbol, bias_score, atr_multiplier, historical_data, atr_value=atr_value)
         return {"veredicto": "EJECUTADO", "bias": bias_score}
     except Exception as e:
         return {"veredicto": f"ERROR_EXEC: {str(e)[:10]}", "bias": bias_score}  
@@ -496,26 +879,29 @@ def execute_live_trade(kraken, symbol, atr_multiplier=0.05, timeframe='1h', hour
 
 def preprocess_data_for_time_bias(df):
     """
-    Normaliza el timestamp a UTC y calcula la volatilidad de la vela.
+    Normaliza el timestamp a UTC, calcula la volatilidad de la vela y marca la
+    Kill Zone en una sola pasada sobre los arrays NumPy.
     """
     
-    # 1. Asegurar UTC (si el timestamp no tiene una zona horaria asignada)
-    # Convertimos el timestamp a un índice de pandas para facilitar el manejo.
-    df = df.set_index(df['timestamp'])
-    
-    # Localizar (o asignar) la zona horaria UTC. 
-    # Usamos .tz_localize para ASIGNAR la zona horaria a datos 'naive' (sin zona horaria).
-    if df.index.tz is None:
-        df.index = df.index.tz_localize(pytz.utc)
+    # 1. Hora UTC directamente del epoch, sin reconstruir el índice del DataFrame.
+    # Los timestamps 'naive' de ccxt ya son epoch UTC; si la columna trae otra zona
+    # horaria se pasa a UTC antes de truncar a horas.
+    timestamps = df['timestamp']
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert(None)
+    hours = timestamps.to_numpy(dtype='datetime64[h]').astype(np.int64) % 24
 
     # 2. Crear Columna de Hora (Para la estrategia de Kill Zones)
-    df['hour_utc'] = df.index.hour
+    df['hour_utc'] = hours
     
     # 3. Calcular Rango (Volatilidad)
-    df['candle_range'] = df['high'] - df['low']
+    df['candle_range'] = df['high'].to_numpy() - df['low'].to_numpy()
+
+    # 4. Marcar la Kill Zone con las mismas horas ya calculadas
+    df['is_kill_zone'] = _kill_zone_mask(hours)
     
-    logging.info(f"Datos pre-procesados. Zona horaria: {df.index.tz}")
-    return df.reset_index(drop=True)
+    log.debug("Datos pre-procesados. Zona horaria: UTC")
+    return df
 
 
 # Tiempos de ejemplo para la superposición Londres/Nueva York:
@@ -523,47 +909,58 @@ def preprocess_data_for_time_bias(df):
 KILL_ZONE_START = 14
 KILL_ZONE_END = 18
 
+# Máscara de 24 bits: el bit h está activo si la hora h (UTC) pertenece a la Kill Zone.
+# Con los valores actuales vale 0x3C000; admite zonas no contiguas sin más comparaciones.
+KZ_MASK = sum(1 << h for h in range(KILL_ZONE_START, KILL_ZONE_END))
+
+# La misma máscara como tabla de 24 booleanos: marcar un array de horas es un único gather
+_KZ_TABLE = (np.left_shift(1, np.arange(24)) & KZ_MASK) != 0
+
+def _kill_zone_mask(hours):
+    """Devuelve True para cada hora UTC (array de enteros 0-23) cuyo bit está en KZ_MASK."""
+    return _KZ_TABLE[hours]
+
 def mark_kill_zones(df):
     """
     Marca las velas que caen dentro de la Kill Zone de alta liquidez.
+    preprocess_data_for_time_bias ya la marca; esta función recalcula la columna
+    a partir de 'hour_utc' para DataFrames preparados por otra vía.
     """
-    # 1. Crear una columna booleana que es True si la hora está dentro del rango
-    df['is_kill_zone'] = (df['hour_utc'] >= KILL_ZONE_START) & (df['hour_utc'] < KILL_ZONE_END)
+    # 1. Crear una columna booleana que es True si el bit de la hora está en KZ_MASK
+    df['is_kill_zone'] = _kill_zone_mask(df['hour_utc'].to_numpy(dtype=np.int64))
     
-    logging.info("Kill Zones marcadas en el DataFrame.")
+    log.debug("Kill Zones marcadas en el DataFrame.")
     return df
 
 
 # NUEVO INDICADOR: Devolver el Retorno Bruto (GR) de la Kill Zone
-def analyze_gross_return(df):
+def analyze_gross_return(df=None, stats=None):
     """Calcula el Retorno Bruto Promedio (GR) por vela en la Kill Zone."""
     
-    # Calcular el cambio absoluto por vela
-    df['gross_return'] = df['close'] - df['open']
+    # Medias por grupo de una sola pasada (compartidas con el estratega si ya se calcularon)
+    if stats is None:
+        stats = kill_zone_stats(df)
     
-    # -----------------------------------------------------------------
-    # CORRECCIÓN CRÍTICA: Filtrar por el valor booleano TRUE/FALSE
-    # -----------------------------------------------------------------
-    # 1. Calcular el retorno promedio en la Kill Zone (donde 'is_kill_zone' es True)
-    kill_zone_gr = df[df['is_kill_zone'] == True]['gross_return'].mean()
+    # 1. Retorno promedio en la Kill Zone
+    kill_zone_gr = stats['gross_return_mean'][1]
     
-    # 2. Calcular el retorno promedio fuera de la Kill Zone (donde 'is_kill_zone' es False)
-    low_liquidity_gr = df[df['is_kill_zone'] == False]['gross_return'].mean()
+    # 2. Retorno promedio fuera de la Kill Zone
+    low_liquidity_gr = stats['gross_return_mean'][0]
     
     # Mostrar resultados en consola
-    logging.info("Análisis de Retorno Bruto Promedio (por Vela):")
-    logging.info("-" * 50)
+    log.info("Análisis de Retorno Bruto Promedio (por Vela):")
+    log.info("-" * 50)
     
     # Manejo de NaN para evitar errores
     if pd.isna(kill_zone_gr):
-        logging.warning("KILL ZONE (14:00 a 18:00 UTC): NaN (Movimiento promedio)")
+        log.warning("KILL ZONE (14:00 a 18:00 UTC): NaN (Movimiento promedio)")
         sesgo = "Neutro (Error de Cálculo o Datos insuficientes)."
         return 0.0 # Devolver 0.0 en caso de error para que el if/elif del main no falle
         
     # Continuación si no es NaN
-    logging.info(f"KILL ZONE (14:00 a 18:00 UTC): ${kill_zone_gr:.2f} (Movimiento promedio)")
-    logging.info(f"LOW LIQUIDITY (Otras Horas): ${low_liquidity_gr:.2f} (Movimiento promedio)")
-    logging.info("-" * 50)
+    log.info("KILL ZONE (14:00 a 18:00 UTC): $%.2f (Movimiento promedio)", kill_zone_gr)
+    log.info("LOW LIQUIDITY (Otras Horas): $%.2f (Movimiento promedio)", low_liquidity_gr)
+    log.info("-" * 50)
     
     if kill_zone_gr > 0:
         sesgo = "Ligeramente Alcista (el precio tiende a subir)."
@@ -572,7 +969,7 @@ def analyze_gross_return(df):
     else:
         sesgo = "Neutro."
         
-    logging.info(f"Sesgo de Dirección en la KILL ZONE: {sesgo}")
+    log.info("Sesgo de Dirección en la KILL ZONE: %s", sesgo)
     
     # DEVUELVE el indicador clave: Retorno Bruto de la Kill Zone
     return kill_zone_gr
@@ -582,51 +979,69 @@ def analyze_gross_return(df):
 def trading_loop(exchange):
     """Vigilancia constante de SL/TP y Time Exit"""
     global trading_active
-    logging.info("Motor de vigilancia iniciado.")
+    log.info("Motor de vigilancia iniciado.")
     
-    while True:
+    while not STOP_EVENT.is_set():
         if trading_active:
             try:
-                # MODULO 2: Monitoreo Real
-                real_current_prices = {}
-                for symbol in TARGET_ASSETS:
-                    ticker = exchange.fetch_ticker(symbol)
-                    real_current_prices[symbol] = ticker['last']
+                # MODULO 2: Monitoreo Real (todos los tickers en una sola petición)
+                real_current_prices = fetch_last_prices(exchange, TARGET_ASSETS)
                 
                 # Ejecutar cierre por SL/TP o Tiempo
                 monitor_and_close_positions(real_current_prices, exchange)
                 
             except Exception as e:
-                logging.error(f"Error en el bucle de vigilancia: {e}")
+                log.error("Error en el bucle de vigilancia: %s", e)
         
-        # Dormir 60 segundos para no saturar la API (Rate Limit)
-        time.sleep(60)
+        # Esperar 60 segundos para no saturar la API (Rate Limit), salvo apagado
+        if STOP_EVENT.wait(MONITOR_SECONDS):
+            break
 
 
 
-def calculate_atr(df, window=20): 
+def calculate_atr(high, low, close, window=20): 
     """
     Calcula el Average True Range (ATR) para la volatilidad, utilizando una ventana
     de N velas (por defecto 20) para el cálculo del valor final.
+    Recibe directamente los arrays high/low/close (p. ej. df['high'].to_numpy()).
     """
     # Usamos la ventana definida (ahora 20) para el cálculo del ATR.
     # Esto asegura que el valor ATR de la última vela refleje la volatilidad de las 20 velas anteriores.
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+
+    # True Range: el mayor entre el rango de la vela y los huecos contra el cierre previo,
+    # todo en arrays NumPy. fmax ignora el NaN de la primera vela (sin cierre previo),
+    # donde queda solo high - low
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    # Suavizado de Wilder (RMA): EMA con alpha = 1/window sembrada con la media simple de
+    # las primeras N velas (mismo resultado que ta.volatility). Solo se usa el último valor,
+    # así que se evalúa en forma cerrada: semilla * (1-alpha)^m + suma ponderada de los m TR
+    # restantes con pesos alpha * (1-alpha)^k, sin Series ni bucle Python
+    m = len(tr) - window
+    if m < 0:
+        raise ValueError(f"ATR necesita al menos {window} velas (recibidas {len(tr)}).")
+    alpha = 1.0 / window
+    decay = 1.0 - alpha
+    weights = alpha * decay ** np.arange(m - 1, -1, -1, dtype=np.float64)
     
-    # Asegúrate de que las columnas 'high', 'low', 'close' estén presentes
-    df['atr'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=window)
-    
-    # Devolver el ATR de la última vela (este valor ya es el resultado del cálculo de 20 periodos)
-    return df['atr'].iloc[-1]
+    # Devolver el ATR de la última vela
+    return float(tr[:window].mean() * decay ** m + np.dot(weights, tr[window:]))
 
-def calculate_exit_levels(entry_price, atr_value, direction):
+def calculate_exit_levels(entry_price, atr_value, direction, symbol=None):
     """Calcula los niveles de Stop Loss y Take Profit."""
-    
-    # Parámetros de Riesgo/Recompensa
-    SL_MULTIPLIER = 1.5  # Asumir 1.5x el ATR de riesgo
-    TP_MULTIPLIER = 3.0  # Asumir 3.0x el ATR de recompensa (R:R 1:2)
-    
-    risk_amount = atr_value * SL_MULTIPLIER
-    profit_amount = atr_value * TP_MULTIPLIER
+    # Mejora de precisión para evitar cierres erróneos en UNI/ADA: tabla por activo y,
+    # para símbolos fuera de la tabla, según el precio
+    precision = SYMBOL_PRECISION.get(symbol)
+    if precision is None:
+        precision = 4 if entry_price < 10 else 2
+    risk_amount = atr_value * SL_ATR_MULTIPLIER
+    profit_amount = atr_value * TP_ATR_MULTIPLIER
 
     if direction == "LONG (COMPRA)":
         # SL: Por debajo del precio de entrada
@@ -644,114 +1059,144 @@ def calculate_exit_levels(entry_price, atr_value, direction):
         # En caso neutral, no hay niveles
         return None, None
     
-    return round(stop_loss, 2), round(take_profit, 2)
+    return round(stop_loss, precision), round(take_profit, precision)
+
+
+# Códigos de salida devueltos por _scan_exits (0 = la posición sigue abierta)
+EXIT_REASONS = {1: "TAKE PROFIT (TP)", 2: "STOP LOSS (SL)", 3: "TIME EXIT (KZ EXPIRÓ)"}
+
+def _direction_sign(direction):
+    """+1 para LONG, -1 para SHORT (se distingue por el primer carácter)."""
+    return 1 if direction[0] == 'L' else -1
+
+def _scan_exits(positions, current_price_data, time_exit_allowed):
+    """
+    Evalúa SL/TP/Time Exit de todas las posiciones con arrays paralelos (SoA).
+    Devuelve (códigos de salida, precios de cierre) alineados con 'positions'.
+    """
+    # Una sola pasada por las posiciones: cada dict se consulta una vez por campo.
+    # La dirección se reduce a un signo (+1 LONG / -1 SHORT, ver _direction_sign)
+    rows = np.array([(current_price_data.get(p['symbol']), p['take_profit'], p['stop_loss'],
+                      _direction_sign(p['direction'])) for p in positions],
+                    dtype=np.float64).reshape(-1, 4)
+    price, tp, sl, sign = rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+
+    # Sin ramas por dirección: con el signo, LONG y SHORT comparten la misma condición
+    # (sign * (precio - nivel)). NaN nunca cumple una comparación: sin precio no se evalúa nada
+    has_price = ~np.isnan(price)
+    hit_tp = sign * (price - tp) >= 0
+    hit_sl = ~hit_tp & (sign * (price - sl) <= 0)
+    time_exit = has_price & ~hit_tp & ~hit_sl & time_exit_allowed
+
+    exit_codes = np.select([hit_tp, hit_sl, time_exit], [1, 2, 3], default=0)
+    close_prices = np.select([hit_tp, hit_sl], [tp, sl], default=price)
+    return exit_codes, close_prices
+
+
+def _close_hit_positions(current_price_data, time_exit_allowed):
+    """
+    Retira de OPEN_POSITIONS las posiciones que tocaron SL/TP/Time Exit y las devuelve con
+    su PnL (llamar con _POSITIONS_LOCK). Sin E/S: el banco se actualiza tras soltar el lock
+    con _credit_closed_trades.
+    """
+    # 1-2. SL/TP y Time Exit evaluados para todas las posiciones a la vez (SoA)
+    exit_codes, close_prices = _scan_exits(OPEN_POSITIONS, current_price_data, time_exit_allowed)
+
+    # Solo se recorren las posiciones que cierran; la lista se reconstruye al final en una pasada
+    closing = exit_codes != 0
+    closed_now = []
+    for i in np.flatnonzero(closing):
+        pos = OPEN_POSITIONS[i]
+        symbol = pos['symbol']
+        exit_reason = EXIT_REASONS[exit_codes[i]]
+        close_price = float(close_prices[i])
 
+        # 3. EJECUCIÓN DEL CIERRE
+        # Calcular PnL (el signo de la dirección evita corregirlo a posteriori en SHORT)
+        pnl_usd = _direction_sign(pos['direction']) * (close_price - pos['entry_price']) * pos['amount_base']
 
-def monitor_and_close_positions(current_price_data, exchange):
+        log.info("💰 CIERRE %s | %s | PnL: $%.2f", symbol, exit_reason, pnl_usd)
+        
+        # Registrar el cierre
+        pos['status'] = 'CLOSED'
+        pos['exit_price'] = close_price 
+        pos['exit_reason'] = exit_reason
+        pos['pnl_usd'] = pnl_usd 
+        closed_now.append(pos)
+
+    if closed_now:
+        OPEN_POSITIONS[:] = [p for p, cerrada in zip(OPEN_POSITIONS, closing) if not cerrada]
+        _OPEN_SYMBOLS.difference_update(p['symbol'] for p in closed_now)
+    return closed_now
+
+def _credit_closed_trades(closed_now):
+    """Abona al banco virtual el PnL de los cierres de una vuelta en una sola escritura."""
+    # --- PUNTO CRÍTICO: Actualización del Banco Virtual ---
+    # Sumamos (o restamos) el resultado de los trades al balance de 500$
+    nuevo_saldo = update_virtual_balance(math.fsum(p['pnl_usd'] for p in closed_now))
+    log.info("🏦 Nuevo Saldo: $%.2f", nuevo_saldo)
+
+
+def monitor_and_close_positions(current_price_data, exchange, now_utc=None):
     """
     Monitorea posiciones abiertas y actualiza el saldo virtual al cerrar.
     """
-    global OPEN_POSITIONS, CLOSED_TRADES 
 
-    now_utc = datetime.now(pytz.utc)
-    current_utc_hour = now_utc.hour
+    # Toda la lógica temporal se resuelve una vez, fuera del bucle de posiciones
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
     
     # El Time Exit solo aplica DESPUÉS de la hora de cierre de la Kill Zone
-    time_exit_allowed = (current_utc_hour >= KILL_ZONE_END)
+    time_exit_allowed = now_utc.hour >= KILL_ZONE_END
     
-    logging.info(f"--- [ MONITOREO ACTIVO ] --- Hora: {now_utc.strftime('%H:%M:%S')} UTC")
+    # Formato diferido: la hora solo se formatea si el registro INFO se emite
+    log.info("--- [ MONITOREO ACTIVO ] --- Hora: %s UTC", now_utc.time().replace(microsecond=0))
 
-    # Recorrer de atrás hacia adelante para evitar errores de índice al eliminar
-    for i in range(len(OPEN_POSITIONS) - 1, -1, -1):
-        pos = OPEN_POSITIONS[i]
-        
-        if isinstance(pos, Position):
-            pos = OPEN_POSITIONS[i] = pos.to_dict()
-            
-        symbol = pos['symbol']
-        current_price = current_price_data.get(symbol)
-        
-        if current_price is None:
-            continue
-            
-        exit_reason = None
-        close_price = None 
-
-        # 1. Lógica de SL/TP
-        if pos['direction'] == 'LONG (COMPRA)':
-            if current_price >= pos['take_profit']:
-                exit_reason, close_price = "TAKE PROFIT (TP)", pos['take_profit']
-            elif current_price <= pos['stop_loss']:
-                exit_reason, close_price = "STOP LOSS (SL)", pos['stop_loss']
-        
-        elif pos['direction'] == 'SHORT (VENTA)':
-            if current_price <= pos['take_profit']: 
-                exit_reason, close_price = "TAKE PROFIT (TP)", pos['take_profit']
-            elif current_price >= pos['stop_loss']: 
-                exit_reason, close_price = "STOP LOSS (SL)", pos['stop_loss']
-
-        # 2. Lógica de Time Exit
-        if exit_reason is None and time_exit_allowed:
-            exit_reason = "TIME EXIT (KZ EXPIRÓ)"
-            close_price = current_price 
-            
-        # 3. EJECUCIÓN DEL CIERRE Y ACTUALIZACIÓN DE CAPITAL
-        if exit_reason:
-            # Calcular PnL
-            pnl_usd = (close_price - pos['entry_price']) * pos['amount_base']
-            if pos['direction'] == 'SHORT (VENTA)':
-                pnl_usd = -pnl_usd 
-
-            # --- PUNTO CRÍTICO: Actualización del Banco Virtual ---
-            # Sumamos (o restamos) el resultado del trade al balance de 500$
-            nuevo_saldo = update_virtual_balance(pnl_usd)
-            # ------------------------------------------------------
-
-            pnl_status = "GANANCIA ✅" if pnl_usd > 0 else "PÉRDIDA ❌"
-            logging.info(f"💰 CIERRE {symbol} | {exit_reason} | PnL: ${pnl_usd:.2f} | Nuevo Saldo: ${nuevo_saldo:.2f}")
-            
-            # Registrar el cierre
-            pos['status'] = 'CLOSED'
-            pos['exit_price'] = close_price 
-            pos['exit_reason'] = exit_reason
-            pos['pnl_usd'] = pnl_usd 
-            
-            CLOSED_TRADES.append(OPEN_POSITIONS.pop(i))
+    # Bajo el lock solo el escaneo, el marcado y la reconstrucción de la lista (sin E/S):
+    # una apertura concurrente no puede desalinear la máscara 'closing' respecto a OPEN_POSITIONS
+    with _POSITIONS_LOCK:
+        closed_now = _close_hit_positions(current_price_data, time_exit_allowed)
+
+    # El banco se actualiza ya fuera del lock. Las cerradas salieron antes de OPEN_POSITIONS:
+    # si la escritura falla, la siguiente vuelta no puede volver a cerrarlas ni abonar su PnL dos veces
+    try:
+        if closed_now:
+            _credit_closed_trades(closed_now)
+    finally:
+        # Aunque falle el banco, las posiciones ya retiradas quedan registradas y guardadas
+        if closed_now:
+            CLOSED_TRADES.extend(closed_now)
+            append_closed_trades(closed_now)
             save_open_positions()
 
     if not OPEN_POSITIONS:
-        logging.info("📭 Sin posiciones abiertas.")
+        log.info("📭 Sin posiciones abiertas.")
 
 
 # ----------------------------------------------------
 # NUEVA FUNCIÓN: SIMULACIÓN DE ENTRADA DE TRADING
 # ----------------------------------------------------
 
-def execute_trade_simulation(symbol, bias_score, atr_multiplier_value, historical_data): 
+def execute_trade_simulation(symbol, bias_score, atr_multiplier_value, historical_data, atr_value=None): 
     """
     Simula una orden de mercado con cálculo de Stop Loss y Take Profit.
-    Ahora incluye filtro de robustez ATR Mín/Máx.
+    Ahora incluye filtro de robustez ATR Mín/Máx. 'historical_data' son velas OHLCV.
     """
-    # --- CAMBIO CRÍTICO: Riesgo Dinámico ---
-    saldo_actual = get_virtual_balance()
-    # Arriesgamos el 1% del capital total por operación (50$ si hay 500$)
-    amount_usd = saldo_actual * 0.01 
-    
-    entry_price = historical_data['close'].iloc[-1]
-    amount_base = amount_usd / entry_price
+    # FILTRO ANTI-DUPLICADOS
+    if symbol in _OPEN_SYMBOLS: return
 
-    # 1. Obtener precios y calcular ATR
+    # 1. Obtener precios y calcular ATR (el precio de entrada se lee una sola vez del array)
     try:
-        entry_price = historical_data['close'].iloc[-1] 
-        # Se llama a la función ATR, que ahora debe tener la lógica de las últimas 20 velas
-        atr_value = calculate_atr(historical_data.copy())
-        open_time = historical_data.index[-1]
+        entry_price = float(historical_data.close[-1])
+        # Si el análisis ya lo calculó (analyze_symbol) se reutiliza
+        if atr_value is None:
+            atr_value = calculate_atr(historical_data.high, historical_data.low, historical_data.close)
         
         # CÁLCULO DEL UMBRAL DINÁMICO
         dynamic_threshold = atr_value * atr_multiplier_value 
 
     except Exception as e:
-        logging.error(f"ERROR al calcular ATR/Precios para {symbol}: {e}")
+        log.error("ERROR al calcular ATR/Precios para %s: %s", symbol, e)
         return
     
     # ----------------------------------------------------
@@ -762,11 +1207,11 @@ def execute_trade_simulation(symbol, bias_score, atr_multiplier_value, historica
     MAX_ATR_USD = 100.0 
 
     if atr_value < MIN_ATR_USD:
-        logging.info(f"DECISIÓN: MANTENERSE AL MARGEN (VOLATILIDAD MUERTA). ATR (${atr_value:.2f}) < Umbral Mínimo (${MIN_ATR_USD:.2f}).")
+        log.info("DECISIÓN: MANTENERSE AL MARGEN (VOLATILIDAD MUERTA). ATR ($%.2f) < Umbral Mínimo ($%.2f).", atr_value, MIN_ATR_USD)
         return
 
     if atr_value > MAX_ATR_USD:
-        logging.info(f"DECISIÓN: MANTENERSE AL MARGEN (VOLATILIDAD EXTREMA). ATR (${atr_value:.2f}) > Umbral Máximo (${MAX_ATR_USD:.2f}).")
+        log.info("DECISIÓN: MANTENERSE AL MARGEN (VOLATILIDAD EXTREMA). ATR ($%.2f) > Umbral Máximo ($%.2f).", atr_value, MAX_ATR_USD)
         return
     # ----------------------------------------------------
 
@@ -777,100 +1222,92 @@ def execute_trade_simulation(symbol, bias_score, atr_multiplier_value, historica
         direction = "SHORT (VENTA)"
     else:
         direction = "NEUTRAL"
-        logging.info(f"DECISIÓN: MANTENERSE AL MARGEN (SESGO NEUTRO). Umbral requerido: ${dynamic_threshold:.2f}")
+        log.info("DECISIÓN: MANTENERSE AL MARGEN (SESGO NEUTRO). Umbral requerido: $%.2f", dynamic_threshold)
         return
         
     # 3. Calcular los niveles de salida 
-    stop_loss, take_profit = calculate_exit_levels(entry_price, atr_value, direction)
+    stop_loss, take_profit = calculate_exit_levels(entry_price, atr_value, direction, symbol)
 
     # 4. Simulación y Reporte de la Orden
     amount_usd = 100.0  # Invertir 100 USD
     amount_base = amount_usd / entry_price
     
-    logging.info(f"DECISIÓN: INICIAR {direction}")
-    logging.info("-" * 50)
-    logging.info("--- ORDEN SIMULADA ---")
-    logging.info(f"Activo: {symbol}")
-    logging.info(f"Dirección: {direction}")
-    logging.info(f"Score (GR): ${bias_score:.2f}")
-    logging.info(f"Precio Entrada: ${entry_price:.2f}")
-    logging.info(f"Cantidad Base: {amount_base:.5f} {symbol.split('/')[0]}")
-    logging.info(f"Volatilidad (ATR): ${atr_value:.2f}")
-    logging.info(f"STOP LOSS (SL): ${stop_loss:.2f}")
-    logging.info(f"TAKE PROFIT (TP): ${take_profit:.2f}")
-    logging.info("-" * 50)
+    # Un único registro multilínea; con INFO desactivado no se prepara ni un argumento
+    if log.isEnabledFor(logging.INFO):
+        log.info(
+            "DECISIÓN: INICIAR %s\n%s\n--- ORDEN SIMULADA ---\n"
+            "Activo: %s\nDirección: %s\nScore (GR): $%.2f\nPrecio Entrada: $%.2f\n"
+            "Cantidad Base: %.5f %s\nVolatilidad (ATR): $%.2f\n"
+            "STOP LOSS (SL): $%.2f\nTAKE PROFIT (TP): $%.2f\n%s",
+            direction, "-" * 50, symbol, direction, bias_score, entry_price,
+            amount_base, BASE_CCY.get(symbol) or symbol.split('/', 1)[0], atr_value, stop_loss, take_profit, "-" * 50,
+        )
 
     # 5. Guardar la posición
-    # Crear instancia Position para mayor consistencia
-    ot = open_time
-    # Convertir pandas.Timestamp a datetime si es necesario
-    try:
-        import pandas as _pd
-        if isinstance(ot, _pd.Timestamp):
-            ot = ot.to_pydatetime()
-    except Exception:
-        pass
-
-    pos_obj = Position(
-        symbol=symbol,
-        direction=direction,
-        entry_price=entry_price,
-        amount_base=amount_base,
-        stop_loss=stop_loss,
-        take_profit=take_profit,
-        status='OPEN',
-        open_time=ot
-    )
-    OPEN_POSITIONS.append(pos_obj)
-
-    save_open_positions()
+    # Se guarda directamente el dict (mismos campos que Position) con open_time ya en ISO:
+    # el guardado no tiene que transformar nada. Si otro hilo abrió el símbolo entretanto, no se duplica
+    added = _add_open_position({
+        'symbol': symbol,
+        'direction': direction,
+        'entry_price': entry_price,
+        'amount_base': amount_base,
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'status': 'OPEN',
+        'open_time': datetime.now(timezone.utc).isoformat(),
+    })
+
+    if added:
+        request_save_open_positions()
 
 
 def print_final_trade_report(custom_prefix=None):
     """Envía un reporte analítico de nivel profesional a Telegram."""
-    global CLOSED_TRADES
     
     if not CLOSED_TRADES:
         msg = "📊 *REPORTE DE JORNADA*\nNo hay operaciones cerradas todavía."
-        bot.send_message(CHAT_ID, msg)
+        enviar_telegram(msg)
         return
         
-    df_results = pd.DataFrame(CLOSED_TRADES)
+    # Cálculos Métricos directamente sobre la lista (unos cientos de dicts: sin DataFrame)
+    pnls = [t['pnl_usd'] for t in CLOSED_TRADES]
+    total_pnl = math.fsum(pnls)
+    ganancias = [p for p in pnls if p > 0]
+    n_wins = len(ganancias)
+    n_losses = len(pnls) - n_wins
     
-    # Cálculos Métricos
-    total_pnl = df_results['pnl_usd'].sum()
-    wins = df_results[df_results['pnl_usd'] > 0]
-    losses = df_results[df_results['pnl_usd'] <= 0]
-    
-    gross_profit = wins['pnl_usd'].sum()
-    gross_loss = abs(losses['pnl_usd'].sum())
+    gross_profit = math.fsum(ganancias)
+    gross_loss = abs(math.fsum(p for p in pnls if p <= 0))
     profit_factor = gross_profit / gross_loss if gross_loss != 0 else float('inf')
-    win_rate = (len(wins) / len(df_results)) * 100
+    win_rate = (n_wins / len(pnls)) * 100
 
-    # Construcción del mensaje
-    report_msg = custom_prefix if custom_prefix else "📊 *AUDITORÍA DE DISCIPLINA AUTOMATIZADA*\n"
-    report_msg += "--------------------------------------------------\n"
+    # Construcción del mensaje: las piezas se acumulan en una lista y se unen una sola vez
+    separador = "--------------------------------------------------\n"
+    parts = [custom_prefix if custom_prefix else "📊 *AUDITORÍA DE DISCIPLINA AUTOMATIZADA*\n", separador]
     
-    for _, row in df_results.iterrows():
-        icon = "✅" if row['pnl_usd'] > 0 else "❌"
-        # Mostramos el símbolo y el motivo de salida
-        report_msg += f"{icon} *{row['symbol']}* | {row['exit_reason']}\n"
-        report_msg += f"      PnL: `${row['pnl_usd']:.2f}`\n"
+    # Una línea por operación (se muestra el símbolo y el motivo de salida)
+    parts.extend(
+        f"{'✅' if t['pnl_usd'] > 0 else '❌'} *{t['symbol']}* | {t['exit_reason']}\n      PnL: `${t['pnl_usd']:.2f}`\n"
+        for t in CLOSED_TRADES
+    )
     
-    report_msg += "--------------------------------------------------\n"
-    report_msg += f"✅ *Ganados:* {len(wins)}  |  ❌ *Perdidos:* {len(losses)}\n"
-    report_msg += f"🎯 *Win Rate:* `{win_rate:.2f}%` \n"
-    report_msg += f"📈 *Profit Factor:* `{profit_factor:.2f}`\n"
-    report_msg += f"💰 *PNL TOTAL:* `${total_pnl:.2f}`\n"
-    report_msg += "--------------------------------------------------\n"
+    parts += [
+        separador,
+        f"✅ *Ganados:* {n_wins}  |  ❌ *Perdidos:* {n_losses}\n",
+        f"🎯 *Win Rate:* `{win_rate:.2f}%` \n",
+        f"📈 *Profit Factor:* `{profit_factor:.2f}`\n",
+        f"💰 *PNL TOTAL:* `${total_pnl:.2f}`\n",
+        separador,
+    ]
     
     # Si hay posiciones abiertas actualmente, avisamos
     if OPEN_POSITIONS:
-        report_msg += f"⚠️ _Aviso: Hay {len(OPEN_POSITIONS)} posiciones aún abiertas._\n"
+        parts.append(f"⚠️ _Aviso: Hay {len(OPEN_POSITIONS)} posiciones aún abiertas._\n")
         
-    report_msg += "🤖 _Ejecución 100% algorítmica._"
+    parts.append("🤖 _Ejecución 100% algorítmica._")
+    report_msg = "".join(parts)
 
-    bot.send_message(CHAT_ID, report_msg, parse_mode='Markdown')
+    enviar_telegram(report_msg)
 
 def main():
     # ---------------------------------------------
@@ -885,20 +1322,19 @@ def main():
     HOURS_TO_ANALYZE = 50 
 
     # Limpieza necesaria
-    global CLOSED_TRADES, OPEN_POSITIONS
-    CLOSED_TRADES = []
+    CLOSED_TRADES.clear()
     
     kraken = initialize_kraken_exchange()
     if not kraken:
-        logging.error("Fallo la inicialización de Kraken. Deteniendo el proceso.")
+        log.error("Fallo la inicialización de Kraken. Deteniendo el proceso.")
         return
 
     # NUEVO: Verificación de Autenticación (Moviendo la lógica del if __name__ == '__main__':)
     try:
         balance = kraken.fetch_balance()
-        logging.info("Autenticación exitosa. Saldo cargado.")
+        log.info("Autenticación exitosa. Saldo cargado.")
     except Exception as e:
-        logging.error(f"Error CRÍTICO de autenticación: {e}. El bot no puede operar. Deteniendo.")
+        log.error("Error CRÍTICO de autenticación: %s. El bot no puede operar. Deteniendo.", e)
         return
 
     # =========================================================
@@ -909,27 +1345,29 @@ def main():
 
     # [MODULO 1: APERTURA DE POSICIONES]
     # Este módulo se ejecutaría solo una vez al día (ej: 14:00 UTC)
-    logging.info(f"[MODULO 1] INICIANDO APERTURA (Multiplicador ATR: {OPTIMAL_ATR_MULTIPLIER:.2f})")
+    log.info("[MODULO 1] INICIANDO APERTURA (Multiplicador ATR: %.2f)", OPTIMAL_ATR_MULTIPLIER)
     
+    # Las velas de todos los activos se descargan en paralelo; el análisis sigue en serie
+    datos = prefetch_recent_data(kraken, [s for s in TARGET_ASSETS if s not in _OPEN_SYMBOLS], TIME_FRAME, HOURS_TO_ANALYZE)
     for symbol in TARGET_ASSETS:
         execute_live_trade(
             kraken, 
             symbol=symbol, 
             atr_multiplier=OPTIMAL_ATR_MULTIPLIER,
-            hours_to_analyze=HOURS_TO_ANALYZE
+            hours_to_analyze=HOURS_TO_ANALYZE,
+            historical_data=datos.get(symbol)
         )
 
     # [MODULO 2: MONITOREO Y CIERRE REAL]
-    logging.info("[MODULO 2] OBTENIENDO PRECIOS DE CIERRE REALES DE KRAKEN...")
+    log.info("[MODULO 2] OBTENIENDO PRECIOS DE CIERRE REALES DE KRAKEN...")
     
-    real_current_prices = {}
-    for symbol in TARGET_ASSETS:
-        try:
-            ticker = kraken.fetch_ticker(symbol)
-            real_current_prices[symbol] = ticker['last'] # Captura el último precio real
-            logging.info(f"Precio capturado: {symbol} -> ${real_current_prices[symbol]}")
-        except Exception as e:
-            logging.error(f"Error al capturar precio real de {symbol}: {e}")
+    # Todos los últimos precios en una sola petición (fetch_tickers)
+    try:
+        real_current_prices = fetch_last_prices(kraken, TARGET_ASSETS)
+        log.info("Precios capturados: %s", real_current_prices)
+    except Exception as e:
+        log.error("Error al capturar precios reales: %s", e)
+        real_current_prices = {}
 
     # Ahora monitoreamos y cerramos con datos REALES del mercado
     monitor_and_close_positions(real_current_prices, kraken) 
@@ -938,36 +1376,84 @@ def main():
     print_final_trade_report()
 
 
+def _serialize_throttle(exchange):
+    """
+    El rate limiter síncrono de ccxt no es seguro entre hilos: con un lock, cada petición
+    concurrente reserva su turno respetando 'rateLimit' y solo se solapa la espera de red.
+    """
+    lock = threading.Lock()
+    throttle = exchange.throttle
+
+    def locked_throttle(cost=None):
+        with lock:
+            throttle(cost)
+            exchange.lastRestRequestTimestamp = exchange.milliseconds()
+
+    exchange.throttle = locked_throttle
+
+
+# Una única instancia de ccxt por proceso (main, __main__ y el dashboard la comparten)
+_EXCHANGE = None
+_EXCHANGE_LOCK = threading.Lock()
+
 def initialize_kraken_exchange():
+    """Devuelve el exchange de Kraken ya configurado; se crea en la primera llamada."""
+    global _EXCHANGE
+    with _EXCHANGE_LOCK:
+        if _EXCHANGE is None:
+            _EXCHANGE = _create_kraken_exchange()
+        return _EXCHANGE
+
+def _create_kraken_exchange():
     try:
         exchange = ccxt.kraken({
             'apiKey': os.getenv('KRAKEN_API_KEY'),
             'secret': os.getenv('KRAKEN_SECRET'),
             'enableRateLimit': True,
         })
+        # Un solo pool keep-alive compartido: el handshake TLS se paga una vez y no por símbolo.
+        # Los fallos de conexión se reintentan dentro del pool con un backoff corto
+        exchange.session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=20,
+                                                       max_retries=Retry(total=2, backoff_factor=0.2)))
+        _serialize_throttle(exchange)
+        # Mercados cargados una sola vez al arrancar: así las descargas en paralelo no
+        # disparan cada una su propio load_markets perezoso
+        try:
+            exchange.load_markets()
+        except Exception as e:
+            log.warning("No se pudieron precargar los mercados de Kraken: %s", e)
         return exchange
     except Exception as e:
-        logging.error(f"Error Kraken: {e}")
+        log.error("Error Kraken: %s", e)
         return None
 
 
 # --- 5. BUCLE PRINCIPAL (El corazón del Bot) ---
 if __name__ == "__main__":
+    setup_logging()
     kraken = initialize_kraken_exchange()
     if kraken:
         load_open_positions()
         
         # Iniciar Telegram en segundo plano
-        threading.Thread(target=lambda: bot.polling(none_stop=True), daemon=True).start()
+        # Long polling: Telegram mantiene la conexión abierta y solo entrega mensajes (los comandos)
+        threading.Thread(target=lambda: bot.infinity_polling(timeout=30, long_polling_timeout=30,
+                                                             allowed_updates=['message']),
+                         daemon=True).start()
         
-        logging.info("🛡️ SISTEMA EN STANDBY. Esperando /start_trading...")
+        # SIGTERM (systemd, docker stop) termina el bucle sin esperar al siguiente ciclo
+        signal.signal(signal.SIGTERM, lambda signum, frame: STOP_EVENT.set())
         
-        while True:
+        log.info("🛡️ SISTEMA EN STANDBY. Esperando /start_trading...")
+        
+        while not STOP_EVENT.is_set():
             if trading_active:
                 try:
                     run_trading_cycle(kraken)
                 except Exception as e:
-                    logging.error(f"Error crítico en el ciclo: {e}")
+                    log.error("Error crítico en el ciclo: %s", e)
             
-            # Esperar 1 minuto entre chequeos
-            time.sleep(900)
\ No newline at end of file
+            # Esperar 15 minutos entre chequeos (Event.wait vuelve en cuanto se pide el apagado)
+            STOP_EVENT.wait(CYCLE_SECONDS)
+        
+        log.info("🛑 Bucle principal detenido.")
\ No newline at end of file
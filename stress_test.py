@@ -1,19 +1,57 @@
-import pandas as pd
 import numpy as np
 
-# Re-definimos la función aquí para el test
-def estratega_no_supervisado(df):
-    kz_data = df[df['is_kill_zone'] == True]
-    if len(kz_data) < 2: return "NEUTRAL"
+# Umbrales de coherencia (cuerpo / rango) del estratega
+UMBRAL_TENDENCIA = 0.6
+UMBRAL_RUIDO = 0.3
+
+# Re-definimos la función aquí para el test (arrays NumPy: open, high, low, close y los
+# índices de las velas de la Kill Zone, calculados una vez al cargar el escenario)
+def estratega_no_supervisado(o, h, l, c, kz_idx):
+    if len(kz_idx) < 2: return "NEUTRAL"
     
-    cuerpo_promedio = (kz_data['close'] - kz_data['open']).abs().mean()
-    rango_promedio = (kz_data['high'] - kz_data['low']).mean()
-    coherencia = cuerpo_promedio / rango_promedio if rango_promedio > 0 else 0
+    # Cuerpo y rango de todas las velas en una pasada; solo se reúnen las de la Kill Zone.
+    # Las dos medias comparten el mismo número de velas: el cociente de sumas es el de medias
+    suma_cuerpo = np.abs(c - o)[kz_idx].sum()
+    suma_rango = (h - l)[kz_idx].sum()
+    coherencia = suma_cuerpo / suma_rango if suma_rango > 0 else 0
     
-    if coherencia > 0.6: return "TENDENCIA_SOLIDA"
-    if coherencia < 0.3: return "RUIDO_LATERAL"
+    if coherencia > UMBRAL_TENDENCIA: return "TENDENCIA_SOLIDA"
+    if coherencia < UMBRAL_RUIDO: return "RUIDO_LATERAL"
     return "NEUTRAL"
 
+def coherencia_batch(O, H, L, C, KZ):
+    """
+    Reducción de N escenarios a la vez: O/H/L/C son arrays (N, T) y KZ la máscara
+    booleana (N, T). Devuelve (coherencia, velas_kz) por escenario. No depende de los
+    umbrales: en un barrido de umbrales se calcula una sola vez.
+    """
+    suma_cuerpo = (np.abs(C - O) * KZ).sum(axis=1)
+    suma_rango = ((H - L) * KZ).sum(axis=1)
+    coherencia = np.divide(suma_cuerpo, suma_rango, out=np.zeros_like(suma_cuerpo), where=suma_rango > 0)
+    return coherencia, KZ.sum(axis=1)
+
+def clasificar_coherencia(coherencia, velas_kz, umbral_tendencia=UMBRAL_TENDENCIA, umbral_ruido=UMBRAL_RUIDO):
+    """Etiqueta cada escenario a partir de su coherencia ya calculada."""
+    return np.select([velas_kz < 2, coherencia > umbral_tendencia, coherencia < umbral_ruido],
+                     ["NEUTRAL", "TENDENCIA_SOLIDA", "RUIDO_LATERAL"], "NEUTRAL")
+
+def estratega_batch(O, H, L, C, KZ, umbral_tendencia=UMBRAL_TENDENCIA, umbral_ruido=UMBRAL_RUIDO):
+    """Misma clasificación que estratega_no_supervisado para N escenarios; devuelve N etiquetas."""
+    return clasificar_coherencia(*coherencia_batch(O, H, L, C, KZ), umbral_tendencia, umbral_ruido)
+
+def escenarios_a_matrices(escenarios):
+    """Apila N escenarios de igual longitud en las matrices (N, T) de estratega_batch."""
+    return (*(np.array([d[k] for d in escenarios], dtype=np.float64) for k in ('open', 'high', 'low', 'close')),
+            np.array([d['is_kill_zone'] for d in escenarios], dtype=bool))
+
+def escenario_a_arrays(data):
+    """
+    Convierte un escenario (dict de listas) en los arrays que recibe el estratega.
+    La Kill Zone se materializa aquí, una sola vez, como array de índices.
+    """
+    return (*(np.asarray(data[k], dtype=np.float64) for k in ('open', 'high', 'low', 'close')),
+            np.flatnonzero(np.asarray(data['is_kill_zone'], dtype=bool)))
+
 print("🔬 INICIANDO SIMULACIÓN DE MERCADO...")
 
 # --- ESCENARIO 1: RUIDO LATERAL (Mucho latigazo, poco cuerpo) ---
@@ -25,8 +63,6 @@ data_ruido = {
     'close': [100.5, 100.8, 100.2, 101.5], # El precio no avanza
     'is_kill_zone': [True, True, True, True]
 }
-df_ruido = pd.DataFrame(data_ruido)
-resultado_1 = estratega_no_supervisado(df_ruido)
 
 # --- ESCENARIO 2: TENDENCIA LIMPIA (Cuerpos largos, pocas mechas) ---
 data_tendencia = {
@@ -36,13 +72,17 @@ data_tendencia = {
     'close': [109, 119, 129, 140], # El precio avanza con fuerza
     'is_kill_zone': [True, True, True, True]
 }
-df_tendencia = pd.DataFrame(data_tendencia)
-resultado_2 = estratega_no_supervisado(df_tendencia)
+
+# Todos los escenarios se clasifican en una sola llamada vectorizada
+escenarios = [data_ruido, data_tendencia]
+resultado_1, resultado_2 = estratega_batch(*escenarios_a_matrices(escenarios))
+# Comprobación cruzada con la versión de un escenario
+coinciden = [estratega_no_supervisado(*escenario_a_arrays(d)) for d in escenarios] == [resultado_1, resultado_2]
 
 print(f"\n🚩 Resultado Mercado Ruido: {resultado_1}")
 print(f"✅ Resultado Mercado Tendencia: {resultado_2}")
 
-if resultado_1 == "RUIDO_LATERAL" and resultado_2 == "TENDENCIA_SOLIDA":
+if resultado_1 == "RUIDO_LATERAL" and resultado_2 == "TENDENCIA_SOLIDA" and coinciden:
     print("\n🔥 TEST PASADO: El estratega detecta la basura y la separa del oro.")
 else:
     print("\n❌ TEST FALLIDO: Hay que ajustar los umbrales de coherencia.")
\ No newline at end of file
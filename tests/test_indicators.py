@@ -0,0 +1,83 @@
+import sys
+import pathlib
+import numpy as np
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import kraken_data as kd
+
+
+def _atr_wilder_reference(high, low, close, window):
+    # implementación de referencia con bucle (semántica de ta.volatility.average_true_range)
+    tr = [high[0] - low[0]]
+    for i in range(1, len(close)):
+        tr.append(max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1])))
+    atr = sum(tr[:window]) / window
+    for i in range(window, len(tr)):
+        atr = (atr * (window - 1) + tr[i]) / window
+    return atr
+
+
+def test_calculate_atr_matches_wilder_loop():
+    rng = np.random.default_rng(42)
+    close = 100 + rng.normal(0, 1, 50).cumsum()
+    high = close + rng.random(50)
+    low = close - rng.random(50)
+
+    expected = _atr_wilder_reference(high, low, close, window=20)
+    assert np.isclose(kd.calculate_atr(high, low, close, window=20), expected)
+
+
+def test_preprocess_marks_kill_zone_in_one_pass():
+    # 24 velas horarias desde medianoche UTC
+    start = 1734307200000  # 2024-12-16 00:00 UTC
+    rows = [[start + h * 3600000, 1.0, 2.0, 0.5, 1.5, 10.0] for h in range(24)]
+    df = kd.OHLCV.from_ccxt(rows).to_frame()
+
+    out = kd.preprocess_data_for_time_bias(df)
+
+    assert out['hour_utc'].tolist() == list(range(24))
+    kz_hours = out.loc[out['is_kill_zone'].to_numpy(), 'hour_utc'].tolist()
+    assert kz_hours == list(range(kd.KILL_ZONE_START, kd.KILL_ZONE_END))
+    assert (out['candle_range'] == 1.5).all()
+
+
+def test_analyze_symbol_memoizes_same_candle():
+    start = 1734307200000
+    rows = [[start + h * 3600000, 1.0, 2.0, 0.5, 1.5 + h, 10.0] for h in range(24)]
+    candles = kd.OHLCV.from_ccxt(rows)
+
+    first = kd.analyze_symbol('TEST/USD', candles)
+    assert kd.analyze_symbol('TEST/USD', candles) is first
+
+    # una vela nueva invalida la entrada de forma natural
+    rows.append([start + 24 * 3600000, 1.0, 2.0, 0.5, 1.5, 10.0])
+    assert kd.analyze_symbol('TEST/USD', kd.OHLCV.from_ccxt(rows)) is not first
+
+    # mismo resultado que el pipeline de pandas
+    df = kd.preprocess_data_for_time_bias(kd.OHLCV.from_ccxt(rows).to_frame())
+    _, bias, _ = kd.analyze_symbol('TEST/USD', kd.OHLCV.from_ccxt(rows))
+    assert bias == kd.analyze_gross_return(df)
+
+
+def test_fetch_recent_ohlcv_merges_incremental_candles():
+    hour = 3600000
+    rows = [[i * hour, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(60)]
+
+    class FakeExchange:
+        def __init__(self):
+            self.calls = []
+
+        def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+            self.calls.append(since)
+            return rows[-limit:] if since is None else [r for r in rows if r[0] >= since]
+
+    ex = FakeExchange()
+    kd.fetch_recent_ohlcv(ex, 'MERGE/USD', '1h', 50)
+
+    # la vela en curso cambia y abre una nueva
+    rows[-1] = [59 * hour, 1.0, 9.0, 0.5, 8.0, 20.0]
+    rows.append([60 * hour, 8.0, 8.5, 7.5, 8.2, 1.0])
+    out = kd.fetch_recent_ohlcv(ex, 'MERGE/USD', '1h', 50)
+
+    assert ex.calls == [None, 58 * hour]
+    assert len(out.ts) == 50
+    assert out.ts[-1] == 60 * hour and out.high[-2] == 9.0
@@ -0,0 +1,57 @@
+import sys
+import pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import kraken_data as kd
+
+
+def _pos(symbol, direction, sl, tp):
+    return {'symbol': symbol, 'direction': direction, 'entry_price': 100.0,
+            'amount_base': 1.0, 'stop_loss': sl, 'take_profit': tp, 'status': 'OPEN'}
+
+
+def test_scan_exits_sl_tp_and_time_exit():
+    positions = [
+        _pos('BTC/USD', 'LONG (COMPRA)', 90.0, 120.0),   # toca TP
+        _pos('ETH/USD', 'SHORT (VENTA)', 110.0, 80.0),   # toca SL
+        _pos('ADA/USD', 'LONG (COMPRA)', 90.0, 120.0),   # sigue abierta
+        _pos('XRP/USD', 'SHORT (VENTA)', 110.0, 80.0),   # sin precio
+    ]
+    prices = {'BTC/USD': 125.0, 'ETH/USD': 111.0, 'ADA/USD': 100.0}
+
+    codes, close = kd._scan_exits(positions, prices, time_exit_allowed=False)
+    assert codes.tolist() == [1, 2, 0, 0]
+    assert close[:2].tolist() == [120.0, 110.0]
+
+    # fuera de la Kill Zone las que siguen abiertas y tienen precio salen por tiempo
+    codes, close = kd._scan_exits(positions, prices, time_exit_allowed=True)
+    assert codes.tolist() == [1, 2, 3, 0]
+    assert close[2] == 100.0
+
+
+def test_failed_bank_write_does_not_credit_twice(tmp_path, monkeypatch):
+    monkeypatch.setattr(kd, 'POSITIONS_FILE', str(tmp_path / 'open_positions.json'))
+    monkeypatch.setattr(kd, 'CLOSED_TRADES_FILE', str(tmp_path / 'closed_trades.csv'))
+    kd.OPEN_POSITIONS[:] = [_pos('BTC/USD', 'LONG (COMPRA)', 90.0, 120.0),
+                            _pos('ETH/USD', 'LONG (COMPRA)', 90.0, 120.0)]
+    kd._OPEN_SYMBOLS.clear()
+    kd._OPEN_SYMBOLS.update(['BTC/USD', 'ETH/USD'])
+    prices = {'BTC/USD': 125.0, 'ETH/USD': 125.0}
+
+    # el banco acepta la primera escritura y falla en la segunda (disco lleno, EPERM...)
+    credited = []
+    def flaky_update(amount):
+        if len(credited) == 1:
+            raise OSError("disco lleno")
+        credited.append(amount)
+        return 500.0 + amount
+    monkeypatch.setattr(kd, 'update_virtual_balance', flaky_update)
+
+    for _ in range(3):
+        try:
+            kd.monitor_and_close_positions(prices, None)
+        except OSError:
+            pass
+
+    # cada cierre se abona una sola vez y ninguna posición queda abierta
+    assert sum(credited) == 40.0
+    assert kd.OPEN_POSITIONS == [] and not kd._OPEN_SYMBOLS
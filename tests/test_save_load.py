@@ -41,4 +41,28 @@ def test_save_and_load_positions(tmp_path):
     assert 'open_time' in loaded
     # open_time debe ser string iso
     assert isinstance(loaded['open_time'], str)
- 
\ No newline at end of file
+ 
+
+def test_save_keeps_file_mode(tmp_path):
+    tmp_file = tmp_path / "open_positions_mode.json"
+    tmp_file.write_bytes(b"[]")
+    os.chmod(tmp_file, 0o644)
+    kd.POSITIONS_FILE = str(tmp_file)
+    kd.OPEN_POSITIONS.clear()
+
+    kd.save_open_positions()
+
+    # el temporal de mkstemp (0600) no debe imponer sus permisos al reemplazar
+    assert tmp_file.stat().st_mode & 0o777 == 0o644
+
+
+def test_bank_update_keeps_file_mode(tmp_path, monkeypatch):
+    bank = tmp_path / "virtual_bank.json"
+    bank.write_bytes(b'{"balance": 500.0}')
+    os.chmod(bank, 0o644)
+    monkeypatch.setattr(kd, 'BANK_FILE', str(bank))
+    monkeypatch.setattr(kd, '_BALANCE_CACHE', None)
+
+    assert kd.update_virtual_balance(1.0) == 501.0
+    assert json.loads(bank.read_bytes()) == {"balance": 501.0}
+    assert bank.stat().st_mode & 0o777 == 0o644